@@ -1,6 +1,8 @@
 # Make dict a generic (type-subscriptable) type for Python <3.9.
 from __future__ import annotations
 import argparse
+import functools
+import hashlib
 import re
 import sys
 import os
@@ -198,6 +200,53 @@ def timed_invoke(run_n_iters: Callable, gflop_count: float, gbyte_count: float,
   }
 
 
+@functools.lru_cache(maxsize=None)
+def _get_compiler_build_id() -> str:
+  """Identify the compiler build the compilation cache entries depend on.
+
+  Combines the size and modification time of the loaded MLIR and sandbox
+  libraries, which change whenever the C++ passes are rebuilt, with the pinned
+  LLVM version.
+  """
+  import mlir._mlir_libs
+  libs_dir = os.path.dirname(mlir._mlir_libs.__file__)
+  build_id = []
+  for name in sorted(os.listdir(libs_dir)):
+    if '.so' in name or name.endswith(('.dylib', '.pyd')):
+      stat = os.stat(os.path.join(libs_dir, name))
+      build_id.append(f'{name}:{stat.st_size}:{stat.st_mtime_ns}')
+  pinned_llvm_version = os.path.join(os.path.dirname(__file__), os.pardir,
+                                     os.pardir, os.pardir,
+                                     'pinned-llvm-version')
+  if os.path.exists(pinned_llvm_version):
+    with open(pinned_llvm_version, 'r') as f:
+      build_id.append(f.read().strip())
+  return '\n'.join(build_id)
+
+
+def _get_compilation_cache_file(module: Module,
+                                transform: Callable) -> Optional[str]:
+  """Return the file caching the result of applying `transform` to `module`.
+
+  Caching is enabled by setting the `SANDBOX_COMPILATION_CACHE_DIR` environment
+  variable. The key covers the compiler build, the input IR and every pipeline
+  of the transform. Returns None if caching is disabled or if some transform
+  does more than running a pass pipeline, e.g. an IR printer.
+  """
+  cache_dir = os.environ.get('SANDBOX_COMPILATION_CACHE_DIR')
+  if not cache_dir or not isinstance(transform, TransformationList):
+    return None
+  pipelines = []
+  for t in transform.transforms:
+    pipeline = t._get_fusable_pipeline()
+    if pipeline is None:
+      return None
+    pipelines.append(pipeline)
+  key = hashlib.sha256('\n'.join([_get_compiler_build_id(),
+                                  str(module)] + pipelines).encode())
+  return os.path.join(cache_dir, key.hexdigest() + '.mlir')
+
+
 # TODO: support more than just RankedTensorType.
 def get_mlir_abi_compatible_type(value):
   return get_ranked_memref_descriptor(value)
@@ -277,8 +326,24 @@ class ProblemInstance:
             fun_to_benchmark_name, types, zero_at_each_iteration)
         wrapper = emit_benchmarking_function(entry_point_name, func)
 
+      # On a cache hit, parse the previously transformed IR instead of running
+      # the transformations again; on a miss, fill the cache.
+      cache_file = _get_compilation_cache_file(self.mlir_module, transform)
+
       def apply_transform_to_entry_point_name(module):
-        return transform(entry_point_name, module)
+        if cache_file and os.path.exists(cache_file):
+          with open(cache_file, 'r') as f:
+            return Module.parse(f.read())
+        transformed_module = transform(entry_point_name, module)
+        if cache_file:
+          os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+          # Write to a temporary file first so that concurrent benchmarks
+          # never read a partially written entry.
+          tmp_file = f'{cache_file}.{os.getpid()}.tmp'
+          with open(tmp_file, 'w') as f:
+            f.write(str(transformed_module))
+          os.replace(tmp_file, cache_file)
+        return transformed_module
 
       transformed_module, self.mlir_execution_engine = compile_to_execution_engine(
           self.mlir_module, apply_transform_to_entry_point_name)
@@ -0,0 +1,68 @@
+# RUN: %PYTHON %s 2>&1 | FileCheck %s
+
+# This file checks the on-disk compilation cache of the harness.
+
+import os
+import tempfile
+
+from ..contraction.definitions import EinsumProblem
+from .experts import *
+from .harness import *
+from .transforms import *
+
+sizes = {'m': 24, 'n': 32, 'k': 48}
+
+
+def compile_and_run(expert):
+  """Compile and run a matmul with `expert`. Raises if the results are wrong."""
+  problem = ProblemInstance(EinsumProblem('mk,kn', 'mnk', 2), [np.float32] * 3)
+  problem.compile(entry_point_name='main',
+                  fun_to_benchmark_name='matmul',
+                  compile_time_problem_sizes_dict=sizes,
+                  transform=expert)
+  problem.run(n_iters=1,
+              entry_point_name='main',
+              runtime_problem_sizes_dict=sizes)
+
+
+def get_cache_entries(cache_dir):
+  """Return the inode of each cache entry, keyed by file name."""
+  return {f: os.stat(os.path.join(cache_dir, f)).st_ino
+          for f in os.listdir(cache_dir)}
+
+
+# CHECK-NOT: FAILURE
+def main():
+  expert = SingleTilingExpert('matmul',
+                              'linalg.generic',
+                              tile_sizes=[8, 8, 24],
+                              pad=False,
+                              peel=[])
+
+  with tempfile.TemporaryDirectory() as cache_dir:
+    os.environ['SANDBOX_COMPILATION_CACHE_DIR'] = cache_dir
+
+    # A miss transforms the IR and writes a single entry.
+    compile_and_run(expert)
+    entries = get_cache_entries(cache_dir)
+    if len(entries) != 1:
+      print(f'FAILURE: expected one cache entry after a miss, got {entries}')
+
+    # A hit parses the entry back instead of rewriting it, and the compiled
+    # function still computes the right results.
+    compile_and_run(expert)
+    if get_cache_entries(cache_dir) != entries:
+      print(f'FAILURE: expected a cache hit to leave {entries} untouched, got '
+            f'{get_cache_entries(cache_dir)}')
+
+    # Experts printing the IR are not cached.
+    compile_and_run(expert.print_ir(at_begin=True))
+    if get_cache_entries(cache_dir) != entries:
+      print(f'FAILURE: expected the IR printer to bypass the cache, got '
+            f'{get_cache_entries(cache_dir)}')
+
+    del os.environ['SANDBOX_COMPILATION_CACHE_DIR']
+
+
+if __name__ == '__main__':
+  main()
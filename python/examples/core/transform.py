@@ -4,9 +4,86 @@ import functools
 from mlir.ir import Module
 from mlir.passmanager import PassManager
 import typing as tp
-from copy import deepcopy
-
-from .variables import Variable
+from copy import copy, deepcopy
+
+from .variables import (Variable, TilingSizesVariable, InterchangeVariable,
+                        PeelingVariable, PackPaddingVariable,
+                        HoistPaddingVariable)
+
+# Variables holding flat integer lists. Their values are stored as tuples, which
+# are hashable and can key the cache of formatted flags as is. The match is
+# exact: TransposePaddingVariable derives from InterchangeVariable but holds a
+# list of lists.
+_INT_LIST_VARIABLES = (TilingSizesVariable, InterchangeVariable,
+                       PeelingVariable, PackPaddingVariable,
+                       HoistPaddingVariable)
+
+# Default value of list variables. It is immutable, so a single instance can be
+# shared by all the transforms that do not set the variable.
+_EMPTY = ()
+
+
+def _drop_trailing_cleanup(pipeline: str) -> str:
+  """Remove the trailing `canonicalize,cse` from `pipeline`, if any."""
+  for suffix, replacement in ((',canonicalize,cse)', ')'),
+                              (',canonicalize,cse', '')):
+    if pipeline.endswith(suffix):
+      return pipeline[:-len(suffix)] + replacement
+  return pipeline
+
+
+def _elide_redundant_cleanups(
+    transforms: tp.Sequence['Transform']) -> tp.List['Transform']:
+  """Drop the trailing cleanup of transforms followed by one that starts by
+  canonicalizing and CSE'ing the IR anyway.
+
+  Only applied to the final list of transforms, so that a printer inserted
+  after a transform keeps its cleanup and shows the canonicalized IR. The
+  affected transforms are copied so that the instances provided by the caller
+  are left untouched.
+  """
+  result = list(transforms)
+  for i, (t, next_t) in enumerate(zip(transforms, transforms[1:])):
+    pipeline = getattr(t, 'pipeline', None)
+    if pipeline is None or not getattr(next_t, 'canonicalizes_first', False):
+      continue
+    stripped = _drop_trailing_cleanup(pipeline)
+    if stripped != pipeline:
+      result[i] = copy(t)
+      result[i].pipeline = stripped
+  return result
+
+
+def _fuse_pipelines(
+    transforms: tp.Sequence['Transform']
+) -> tp.Iterator[tp.Union['Transform', tp.List['Transform']]]:
+  """Group the consecutive transforms that only run a pipeline.
+
+  Yield, in order, lists of such transforms, whose pipelines can be run by a
+  single PassManager, and the other transforms one at a time.
+  """
+  fused = []
+  for transform in transforms:
+    if transform._get_fusable_pipeline() is not None:
+      fused.append(transform)
+      continue
+    if fused:
+      yield fused
+      fused = []
+    yield transform
+  if fused:
+    yield fused
+
+
+def _run_fused_pipelines(transforms: tp.Sequence['Transform'], module: Module):
+  """Run the pipelines of `transforms` with a single PassManager."""
+  pipeline = ','.join(t._get_fusable_pipeline() for t in transforms)
+  try:
+    PassManager.parse(pipeline).run(module)
+  except Exception as e:
+    names = ', '.join(type(t).__name__ for t in transforms)
+    raise RuntimeError(
+        f"Failed to run the fused pipeline of [{names}]: {pipeline}") from e
 
 
 class _TransformThenDescriptor:
@@ -67,7 +144,10 @@ class Transform:
   """Base class for all parametrized transformations.
 
   Searchable transformation parameters must be listed in the `variables` field.
+  Instances do not carry a `__dict__`: subclasses declare the fields they set,
+  including their `variables`, in `__slots__`.
   """
+  __slots__ = ('module', 'fun_name', 'pipeline')
 
   variables: tp.Mapping[str, tp.Union[tp.Type[Transform],
                                       tp.Tuple[tp.Type[Transform],
@@ -76,12 +156,27 @@ class Transform:
   module: Module
   fun_name: str
 
+  # Whether the pipeline starts by canonicalizing and CSE'ing the IR, in which
+  # case a trailing cleanup of the preceding transform is redundant.
+  canonicalizes_first: bool = False
+
   def __call__(self, module: Module, fun_name: str):
     self.module = module
     self.fun_name = fun_name
     PassManager.parse(self.pipeline).run(module)
     return module
 
+  def _get_fusable_pipeline(self) -> tp.Optional[str]:
+    """Return the pipeline of the transform if running it is all the transform
+    does, None otherwise.
+
+    Such pipelines can be fused with neighboring ones and run by a single
+    PassManager.
+    """
+    if type(self).__call__ is not Transform.__call__:
+      return None
+    return getattr(self, 'pipeline', None)
+
   def _parse_variables_in_kwargs(self, kwargs: tp.Mapping[str, tp.Any]):
     """Set up instance fields that correspond to known variables from kwargs.
 
@@ -101,7 +196,11 @@ class Transform:
         raise ValueError(f"Missing {name} mandatory keyword argument when "
                          f"constructing {cls}.")
       value = kwargs[name] if name in kwargs else cls.variables[name][1]
-      self.__dict__[name] = value
+      variable = cls.variables[name]
+      variable_type = variable[0] if isinstance(variable, tuple) else variable
+      if variable_type in _INT_LIST_VARIABLES:
+        value = tuple(value)
+      setattr(self, name, value)
 
   # Use the Python descriptor mechanism to combine the 'property' mechanism and
   # optional 'classmethod' dispatch. The object is a descriptor that, when read
@@ -124,6 +223,7 @@ class PrintIR(Transform):
   follows:
   * `name`: Printer name.
   """
+  __slots__ = ('name',)
 
   def __init__(self, name='', **kwargs):
     self.name = name
@@ -139,6 +239,7 @@ class PrintPipeline(Transform):
 
   Do not change the module.
   """
+  __slots__ = ('pipelines',)
 
   def __init__(self, t: Transform):
     assert hasattr(t, 'pipeline') or hasattr(t, 'pipelines'), "missing attr"
@@ -182,8 +283,14 @@ class TransformationList:
     self.transforms = transforms
 
   def __call__(self, entry_point_name: str, module: Module):
-    for transform in self.transforms:
-      module = transform(module, entry_point_name)
+    # Consecutive transforms that only run a pipeline are fused into a single
+    # pipeline, parsed and run by a single PassManager.
+    transforms = _elide_redundant_cleanups(self.transforms)
+    for transform in _fuse_pipelines(transforms):
+      if isinstance(transform, list):
+        _run_fused_pipelines(transform, module)
+      else:
+        module = transform(module, entry_point_name)
     return module
 
   def __add__(
@@ -215,7 +322,8 @@ class TransformationList:
   ) -> TransformationList:
     """Return a new transformation list that prints the pipeline commands at the given points."""
     transforms = []
-    for t in self.transforms:
+    # Print the pipelines as they run, i.e., without the redundant cleanups.
+    for t in _elide_redundant_cleanups(self.transforms):
       if before_all and (hasattr(t, 'pipeline') or hasattr(t, 'pipelines')):
         transforms.append(PrintPipeline(t))
       transforms.append(t)
@@ -0,0 +1,113 @@
+# RUN: %PYTHON %s 2>&1 | FileCheck %s
+
+# This file checks how a transformation list fuses the pipelines of consecutive
+# transforms into a single PassManager run.
+
+from mlir.ir import *
+from mlir.passmanager import PassManager
+from mlir.iree_sandbox import register_sandbox_passes_and_dialects
+
+from . import transform as transform_module
+from . import transforms as transforms_module
+from .transform import (Transform, TransformationList, PrintIR,
+                        _drop_trailing_cleanup)
+from .transforms import *
+
+
+class RecordingPassManager:
+  """Record the pipelines parsed by the transforms before parsing them."""
+  pipelines = []
+
+  @staticmethod
+  def parse(pipeline: str) -> PassManager:
+    RecordingPassManager.pipelines.append(pipeline)
+    return PassManager.parse(pipeline)
+
+
+transform_module.PassManager = RecordingPassManager
+transforms_module.PassManager = RecordingPassManager
+
+
+class UnknownPass(Transform):
+  """Run a pass that is not registered."""
+  __slots__ = ()
+
+  def __init__(self):
+    self.pipeline = 'unknown-pass'
+
+
+def run(f):
+  print(f"TEST: {f.__name__}")
+  with Context() as ctx, Location.unknown():
+    register_sandbox_passes_and_dialects(ctx)
+    RecordingPassManager.pipelines = []
+    f()
+
+
+def check_pipelines(transforms, expected):
+  """Run `transforms` as a list and check the pipelines parsed on the way."""
+  TransformationList(transforms=transforms)('matmul', Module.create())
+  if RecordingPassManager.pipelines != expected:
+    print(f"FAILURE: expected the pipelines {expected}, "
+          f"got {RecordingPassManager.pipelines}")
+
+
+def tile():
+  return Tile('matmul', 'linalg.generic', tile_sizes=[8, 8, 24])
+
+
+def vectorize():
+  return Vectorize('matmul', 'linalg.generic')
+
+
+# CHECK-NOT: FAILURE
+
+
+# CHECK-LABEL: TEST: fuse_in_order
+@run
+def fuse_in_order():
+  t, v, b = tile(), vectorize(), Bufferize()
+  l, ll = LowerVectors(), LowerToLLVM()
+  # Bufferize canonicalizes first: the cleanup of Vectorize is elided.
+  fused_pipeline = ','.join([
+      t.pipeline,
+      _drop_trailing_cleanup(v.pipeline), b.pipeline, l.pipelines[0],
+      ll.pipeline
+  ])
+  check_pipelines([t, v, b, l, ll], [fused_pipeline])
+
+
+# CHECK-LABEL: TEST: split_on_inject
+@run
+def split_on_inject():
+  t, v = tile(), vectorize()
+  check_pipelines([t, Inject('module {}'), v], [t.pipeline, v.pipeline])
+
+
+# CHECK-LABEL: TEST: split_on_print_ir
+@run
+def split_on_print_ir():
+  t, v = tile(), vectorize()
+  check_pipelines([t, PrintIR(), v], [t.pipeline, v.pipeline])
+
+
+# CHECK-LABEL: TEST: split_on_lower_vectors_print_after_all
+@run
+def split_on_lower_vectors_print_after_all():
+  b, l, ll = Bufferize(), LowerVectors(print_after_all=True), LowerToLLVM()
+  check_pipelines([b, l, ll], [b.pipeline] + l.pipelines + [ll.pipeline])
+
+
+# CHECK-LABEL: TEST: name_transforms_on_failure
+# CHECK: Failed to run the fused pipeline of [Tile, Vectorize, UnknownPass]
+@run
+def name_transforms_on_failure():
+  expert = TransformationList(transforms=[tile(), vectorize(), UnknownPass()])
+  try:
+    expert('matmul', Module.create())
+  except RuntimeError as e:
+    print(e)
+    if 'of [Tile, Vectorize, UnknownPass]' not in str(e):
+      print("FAILURE: the error does not name the fused transforms")
+    return
+  print("FAILURE: expected the unknown pass to fail")
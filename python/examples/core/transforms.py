@@ -2,38 +2,66 @@ from mlir.ir import *
 from mlir.passmanager import PassManager
 
 from .variables import *
-from .transform import Transform, TransformationList
+from .transform import Transform, TransformationList, _EMPTY
 
 import mlir.all_passes_registration
 
+import functools
 import typing as tp
 
 
-def _get_size_list_as_str(name: str, sizes: tp.List[int]) -> str:
+@functools.lru_cache(maxsize=256)
+def _fmt_ints(sizes: tp.Tuple[int, ...], name: str) -> str:
+  """Format the `name` flag for `sizes`, cached as experts repeat them."""
+  return f'{name}={",".join(map(str, sizes))}'
+
+
+def _get_size_list_as_str(name: str, sizes: tp.Sequence[int]) -> str:
   """Compute the textual tile size flag for the given `transform`."""
-  if not sizes or len(sizes) == 0:
+  if not sizes:
     return ''
-  return f'{name}={",".join([str(ts) for ts in sizes])}'
+  # Variables are already stored as tuples, for which `tuple` is a no-op.
+  return _fmt_ints(tuple(sizes), name)
 
 
 def _get_pad_str(transform: Transform) -> str:
   """Compute the textual padding flags for the given `transform`."""
   if not transform.pad:
     return ''
-  pad_str = f'pad'
-  pack_paddings = [str(pp) for pp in transform.pack_paddings]
-  hoist_paddings = [str(hd) for hd in transform.hoist_paddings]
-  transpose_paddings = [
-      ':'.join([str(dim) for dim in ip]) for ip in transform.transpose_paddings
-  ]
-
-  if pack_paddings:
-    pad_str = pad_str + f' pack-paddings={",".join(pack_paddings)}'
-  if hoist_paddings:
-    pad_str = pad_str + f' hoist-paddings={",".join(hoist_paddings)}'
-  if transpose_paddings:
-    pad_str = pad_str + f' transpose-paddings={",".join(transpose_paddings)}'
-  return pad_str
+  pad_flags = ['pad']
+  if transform.pack_paddings:
+    pad_flags.append(_get_size_list_as_str(name='pack-paddings',
+                                           sizes=transform.pack_paddings))
+  if transform.hoist_paddings:
+    pad_flags.append(_get_size_list_as_str(name='hoist-paddings',
+                                           sizes=transform.hoist_paddings))
+  if transform.transpose_paddings:
+    transpose_paddings = ",".join(
+        ':'.join(map(str, ip)) for ip in transform.transpose_paddings)
+    pad_flags.append(f'transpose-paddings={transpose_paddings}')
+  return ' '.join(pad_flags)
+
+
+# Pipeline templates for the transforms that assemble many optional flags. They
+# are instantiated with a single `format_map` call over the per-instance flags.
+_FUSE_PIPELINE = ('builtin.func(linalg-fuse{{'
+                  'anchor-func={fun_name} '
+                  'anchor-op={op_name} '
+                  '{tile} {interchange} {pad} {vectorize}}},'
+                  'canonicalize,'
+                  'cse)')
+
+_TILE_PIPELINE = ('builtin.func(linalg-single-tiling-expert-driver{{'
+                  'anchor-func={fun_name} '
+                  'anchor-op={op_name} '
+                  '{tile} {interchange} {peel} {scalarize} {pad}}},'
+                  'canonicalize,'
+                  'cse)')
+
+_GENERALIZE_PIPELINE = ('builtin.func(linalg-single-tiling-expert-driver{{'
+                        'anchor-func={fun_name} '
+                        'anchor-op={op_name} '
+                        'generalize}})')
 
 
 class ExperimentalSplitAndFuseFillOp(Transform):
@@ -43,9 +71,10 @@ class ExperimentalSplitAndFuseFillOp(Transform):
   * `tile_sizes`: Tile sizes used for tiling.
   """
 
-  def __init__(self, fun_name: str, op_name: str, tile_sizes=[], **kwargs):
-    if tile_sizes:
-      tile_str = f'tile-sizes={",".join([str(ts) for ts in tile_sizes])}'
+  __slots__ = ()
+
+  def __init__(self, fun_name: str, op_name: str, tile_sizes=(), **kwargs):
+    tile_str = _get_size_list_as_str(name="tile-sizes", sizes=tile_sizes)
     pipeline = (f'linalg-fuse-fill-into-reduction{{'
                 f'     anchor-func={fun_name} '
                 f'     anchor-op={op_name} '
@@ -63,10 +92,15 @@ class Inject(Transform):
   * `ir_to_inject`: Textual IR to inject.
   """
 
+  __slots__ = ('ir_to_inject',)
+
   def __init__(self, ir_to_inject: str, **kwargs):
     self.ir_to_inject = ir_to_inject
 
   def __call__(self, module: Module, fun_name: str, **kwargs):
+    # Parsed modules are bound to a context and the harness creates a new
+    # context per compilation, so the IR is parsed anew on every call. The
+    # result must not be shared either: later transforms modify it in place.
     return Module.parse(self.ir_to_inject)
 
 
@@ -93,37 +127,33 @@ class Fuse(Transform):
   """
 
   variables = {
-      'tile_sizes': (TilingSizesVariable, []),
-      'tile_interchange': (InterchangeVariable, []),
+      'tile_sizes': (TilingSizesVariable, _EMPTY),
+      'tile_interchange': (InterchangeVariable, _EMPTY),
       'pad': (BoolVariable, False),
-      'pack_paddings': (PackPaddingVariable, []),
-      'hoist_paddings': (HoistPaddingVariable, []),
-      'transpose_paddings': (TransposePaddingVariable, []),
+      'pack_paddings': (PackPaddingVariable, _EMPTY),
+      'hoist_paddings': (HoistPaddingVariable, _EMPTY),
+      'transpose_paddings': (TransposePaddingVariable, _EMPTY),
       'vectorize': (BoolVariable, False),
       'vectorize_paddings': (BoolVariable, False),
   }
 
+  __slots__ = tuple(variables)
+
   def __init__(self, fun_name: str, op_name: str, **kwargs):
     self._parse_variables_in_kwargs(kwargs)
-    tile_str = _get_size_list_as_str(name="tile-sizes", sizes=self.tile_sizes)
-    interchange_str = _get_size_list_as_str(name="tile-interchange",
-                                            sizes=self.tile_interchange)
-    pad_str = _get_pad_str(self)
     vectorize_str = ''
     if self.vectorize:
-      vectorize_str = f'vectorize'
-      if self.vectorize_paddings:
-        vectorize_str = vectorize_str + f' vectorize-padding'
-    pipeline = (f'linalg-fuse{{'
-                f'     anchor-func={fun_name} '
-                f'     anchor-op={op_name} '
-                f'     {tile_str} '
-                f'     {interchange_str} '
-                f'     {pad_str} '
-                f'     {vectorize_str}}},'
-                f'canonicalize,'
-                f'cse')
-    self.pipeline = (f'builtin.func({pipeline})')
+      vectorize_str = ('vectorize vectorize-padding'
+                       if self.vectorize_paddings else 'vectorize')
+    self.pipeline = _FUSE_PIPELINE.format_map({
+        'fun_name': fun_name,
+        'op_name': op_name,
+        'tile': _get_size_list_as_str(name="tile-sizes", sizes=self.tile_sizes),
+        'interchange': _get_size_list_as_str(name="tile-interchange",
+                                             sizes=self.tile_interchange),
+        'pad': _get_pad_str(self),
+        'vectorize': vectorize_str,
+    })
 
 
 class Tile(Transform):
@@ -153,41 +183,31 @@ class Tile(Transform):
   """
 
   variables = {
-      'tile_sizes': (TilingSizesVariable, []),
-      'tile_interchange': (InterchangeVariable, []),
+      'tile_sizes': (TilingSizesVariable, _EMPTY),
+      'tile_interchange': (InterchangeVariable, _EMPTY),
       'pad': (BoolVariable, False),
-      'peel': (PeelingVariable, []),
-      'pack_paddings': (PackPaddingVariable, []),
-      'hoist_paddings': (HoistPaddingVariable, []),
-      'transpose_paddings': (TransposePaddingVariable, []),
+      'peel': (PeelingVariable, _EMPTY),
+      'pack_paddings': (PackPaddingVariable, _EMPTY),
+      'hoist_paddings': (HoistPaddingVariable, _EMPTY),
+      'transpose_paddings': (TransposePaddingVariable, _EMPTY),
       'scalarize_dyn_dims': (BoolVariable, False),
   }
 
+  __slots__ = tuple(variables)
+
   def __init__(self, fun_name: str, op_name: str, **kwargs):
     self._parse_variables_in_kwargs(kwargs)
-    tile_str = _get_size_list_as_str(name="tile-sizes", sizes=self.tile_sizes)
-    interchange_str = _get_size_list_as_str(name="tile-interchange",
-                                            sizes=self.tile_interchange)
-    pad_str = _get_pad_str(self)
-    peeled_loops_str = ''
-    scalarize_dyn_dims_str = ''
-    if self.peel:
-      loop_indices = [str(l) for l in self.peel]
-      peeled_loops_str = f'peeled-loops={",".join(loop_indices)}'
-    if self.scalarize_dyn_dims:
-      scalarize_dyn_dims_str = 'scalarize-dynamic-dims'
-
-    pipeline = (f'linalg-single-tiling-expert-driver{{'
-                f'     anchor-func={fun_name} '
-                f'     anchor-op={op_name} '
-                f'     {tile_str} '
-                f'     {interchange_str} '
-                f'     {peeled_loops_str} '
-                f'     {scalarize_dyn_dims_str} '
-                f'     {pad_str}}},'
-                f'canonicalize,'
-                f'cse')
-    self.pipeline = (f'builtin.func({pipeline})')
+    self.pipeline = _TILE_PIPELINE.format_map({
+        'fun_name': fun_name,
+        'op_name': op_name,
+        'tile': _get_size_list_as_str(name="tile-sizes", sizes=self.tile_sizes),
+        'interchange': _get_size_list_as_str(name="tile-interchange",
+                                             sizes=self.tile_interchange),
+        'peel': _get_size_list_as_str(name="peeled-loops", sizes=self.peel),
+        'scalarize': ('scalarize-dynamic-dims'
+                      if self.scalarize_dyn_dims else ''),
+        'pad': _get_pad_str(self),
+    })
 
 
 class LinalgExtTile(Transform):
@@ -199,9 +219,11 @@ class LinalgExtTile(Transform):
   """
 
   variables = {
-      'tile_sizes': (TilingSizesVariable, []),
+      'tile_sizes': (TilingSizesVariable, _EMPTY),
   }
 
+  __slots__ = tuple(variables)
+
   def __init__(self, fun_name: str, op_name: str, **kwargs):
     self._parse_variables_in_kwargs(kwargs)
     assert len(self.tile_sizes) == 1, "expected single tile size, got: " + \
@@ -224,6 +246,8 @@ class LinalgExtTileToSequentialFor(Transform):
 
   variables = {}
 
+  __slots__ = ()
+
   def __init__(self, fun_name: str, op_name: str, **kwargs):
     self._parse_variables_in_kwargs(kwargs)
 
@@ -239,6 +263,8 @@ class LinalgExtTileToInParallel(Transform):
 
   variables = {}
 
+  __slots__ = ()
+
   def __init__(self, fun_name: str, op_name: str, **kwargs):
     self._parse_variables_in_kwargs(kwargs)
 
@@ -254,6 +280,8 @@ class LinalgExtInParallelToSequentialFor(Transform):
 
   variables = {}
 
+  __slots__ = ()
+
   def __init__(self, fun_name: str, op_name: str, **kwargs):
     self._parse_variables_in_kwargs(kwargs)
 
@@ -269,6 +297,8 @@ class LinalgExtInParallelToAsync(Transform):
 
   variables = {}
 
+  __slots__ = ()
+
   def __init__(self, fun_name: str, op_name: str, **kwargs):
     self._parse_variables_in_kwargs(kwargs)
 
@@ -289,6 +319,8 @@ class Vectorize(Transform):
       'vectorize_paddings': (BoolVariable, True),
   }
 
+  __slots__ = tuple(variables)
+
   def __init__(self, fun_name: str, op_name: str, **kwargs):
     self._parse_variables_in_kwargs(kwargs)
     vectorize_paddings_str = ''
@@ -315,19 +347,17 @@ class Generalize(Transform):
   """
 
   variables = {
-      'iterator_interchange': (InterchangeVariable, []),
+      'iterator_interchange': (InterchangeVariable, _EMPTY),
   }
 
+  __slots__ = tuple(variables)
+
   def __init__(self, fun_name: str, op_name: str, **kwargs):
     self._parse_variables_in_kwargs(kwargs)
-    interchange_str = _get_size_list_as_str(name='iterator-interchange',
-                                            sizes=self.iterator_interchange)
-
-    pipeline = (f'linalg-single-tiling-expert-driver{{'
-                f'     anchor-func={fun_name} '
-                f'     anchor-op={op_name} '
-                f'     generalize}}')
-    self.pipeline = (f'builtin.func({pipeline})')
+    self.pipeline = _GENERALIZE_PIPELINE.format_map({
+        'fun_name': fun_name,
+        'op_name': op_name,
+    })
 
 
 class Interchange(Transform):
@@ -340,9 +370,11 @@ class Interchange(Transform):
   """
 
   variables = {
-      'iterator_interchange': (InterchangeVariable, []),
+      'iterator_interchange': (InterchangeVariable, _EMPTY),
   }
 
+  __slots__ = tuple(variables)
+
   def __init__(self, fun_name: str, **kwargs):
     self._parse_variables_in_kwargs(kwargs)
     interchange_str = _get_size_list_as_str(name='iterator-interchange',
@@ -364,6 +396,8 @@ class DecomposeToLowerDimensionalNamedOp(Transform):
   pattern.
   """
 
+  __slots__ = ()
+
   def __init__(self, **kwargs):
     pipeline = (f'linalg-single-tiling-expert-driver{{'
                 f'     decompose-to-lower-dim }}')
@@ -372,6 +406,11 @@ class DecomposeToLowerDimensionalNamedOp(Transform):
 
 class Bufferize(Transform):
 
+  # The bufferization driver canonicalizes and CSEs before bufferizing.
+  canonicalizes_first = True
+
+  __slots__ = ()
+
   def __init__(self, **kwargs):
     pipeline = (f'linalg-bufferization-driver,'
                 f'canonicalize,'
@@ -405,6 +444,8 @@ class LowerVectors(Transform):
       'print_after_all': (BoolVariable, False),
   }
 
+  __slots__ = tuple(variables) + ('stages', 'stage_options')
+
   def __init__(self,
                stages: tp.Union[int, tp.Sequence[int]] = range(7),
                **kwargs):
@@ -413,20 +454,38 @@ class LowerVectors(Transform):
 
     self._parse_variables_in_kwargs(kwargs)
 
-    pipelines = [
-        (f'linalg-vector-lowering{{'
-         f'    lower-vector-stage={stage}'
-         f'    max-transfer-rank={self.max_transfer_rank} '
-         f'    split-transfers={self.split_transfers} '
-         f'    lower-vector-transpose-to={self.transpose_lowering} '
-         f'    lower-vector-transpose-to-avx2={self.transpose_avx2_lowering} '
-         f'    lower-vector-multi-reduction-to={self.multi_reduction_lowering} '
-         f'    lower-vector-contraction-to={self.contraction_lowering} '
-         f'    unroll-vector-transfers={self.unroll_vector_transfers}}},'
-         f'canonicalize,'
-         f'cse') for stage in stages
+    # All stages share the same options, only the stage index differs: store
+    # the options once and expand the per-stage pipelines on demand.
+    self.stages = tuple(stages)
+    self.stage_options = (
+        f'max-transfer-rank={self.max_transfer_rank} '
+        f'split-transfers={self.split_transfers} '
+        f'lower-vector-transpose-to={self.transpose_lowering} '
+        f'lower-vector-transpose-to-avx2={self.transpose_avx2_lowering} '
+        f'lower-vector-multi-reduction-to={self.multi_reduction_lowering} '
+        f'lower-vector-contraction-to={self.contraction_lowering} '
+        f'unroll-vector-transfers={self.unroll_vector_transfers}')
+
+  @property
+  def pipelines(self) -> tp.List[str]:
+    stage_pipelines = [
+        f'linalg-vector-lowering{{'
+        f'lower-vector-stage={stage} {self.stage_options}}}'
+        for stage in self.stages
     ]
-    self.pipelines = [f'builtin.func({pipeline})' for pipeline in pipelines]
+    # Chain all stages in a single pipeline and clean up once at the end, like
+    # `addLowerToVectorTransforms` does on the C++ side. Keep one pipeline per
+    # stage only when the IR must be printed in between.
+    if self.print_after_all:
+      pipelines = [f'{p},canonicalize,cse' for p in stage_pipelines]
+    else:
+      pipelines = [','.join(stage_pipelines) + ',canonicalize,cse']
+    return [f'builtin.func({pipeline})' for pipeline in pipelines]
+
+  def _get_fusable_pipeline(self) -> tp.Optional[str]:
+    if self.print_after_all:
+      return None
+    return self.pipelines[0]
 
   def __call__(self, module: Module, fun_name: str):
     for pipeline in self.pipelines:
@@ -438,6 +497,8 @@ class LowerVectors(Transform):
 
 class LowerToLLVM(Transform):
 
+  __slots__ = ()
+
   def __init__(self, **kwargs):
     pipeline = (f'llvm-lowering,'
                 f'canonicalize,'
@@ -450,10 +511,12 @@ class UnrollOneVectorOp(Transform):
   variables = {
       # Vector unrolling is similar to tiling but using unrolling instead of
       # loops. Use TilingSizesVariable as a searchable type.
-      'source_shape': (TilingSizesVariable, []),
-      'target_shape': (TilingSizesVariable, []),
+      'source_shape': (TilingSizesVariable, _EMPTY),
+      'target_shape': (TilingSizesVariable, _EMPTY),
   }
 
+  __slots__ = tuple(variables)
+
   def __init__(self, fun_name: str, op_name: str, **kwargs):
     self._parse_variables_in_kwargs(kwargs)
     source_shape_str = _get_size_list_as_str(name='source-shape',
@@ -478,6 +541,8 @@ class UnrollOneParentLoop(Transform):
       'unroll_factor': (IntVariable, 1),
   }
 
+  __slots__ = tuple(variables)
+
   def __init__(self, fun_name: str, op_name: str, **kwargs):
     self._parse_variables_in_kwargs(kwargs)
 
@@ -497,6 +562,8 @@ class OutlineOneParentLoop(Transform):
       'parent_loop_num': (IntVariable, 1),
   }
 
+  __slots__ = tuple(variables)
+
   def __init__(self, fun_name: str, op_name: str, result_func_name: str,
                **kwargs):
     self._parse_variables_in_kwargs(kwargs)
@@ -511,20 +578,26 @@ class OutlineOneParentLoop(Transform):
     self.pipeline = (f'builtin.func({pipeline})')
 
 
+@functools.lru_cache(maxsize=None)
+def _build_sparsify_pipeline(options: str) -> str:
+  """Compute the textual sparse compiler pipeline for the given `options`."""
+  return (f'sparsification{{{options}}},'
+          f'sparse-tensor-conversion,'
+          f'builtin.func(convert-linalg-to-loops,convert-vector-to-scf),'
+          f'convert-scf-to-std,'
+          f'func-bufferize,'
+          f'tensor-constant-bufferize,'
+          f'builtin.func(tensor-bufferize,std-bufferize,finalizing-bufferize),'
+          f'convert-vector-to-llvm{{reassociate-fp-reductions=1 enable-index-optimizations=1}},'
+          f'lower-affine,'
+          f'convert-memref-to-llvm,'
+          f'convert-std-to-llvm,'
+          f'reconcile-unrealized-casts')
+
+
 class Sparsify(Transform):
 
+  __slots__ = ()
+
   def __init__(self, options: str):
-    pipeline = (
-        f'sparsification{{{options}}},'
-        f'sparse-tensor-conversion,'
-        f'builtin.func(convert-linalg-to-loops,convert-vector-to-scf),'
-        f'convert-scf-to-std,'
-        f'func-bufferize,'
-        f'tensor-constant-bufferize,'
-        f'builtin.func(tensor-bufferize,std-bufferize,finalizing-bufferize),'
-        f'convert-vector-to-llvm{{reassociate-fp-reductions=1 enable-index-optimizations=1}},'
-        f'lower-affine,'
-        f'convert-memref-to-llvm,'
-        f'convert-std-to-llvm,'
-        f'reconcile-unrealized-casts')
-    self.pipeline = pipeline
+    self.pipeline = _build_sparsify_pipeline(options)
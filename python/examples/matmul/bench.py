@@ -3,6 +3,13 @@
 # This file contains small benchmarks with reasonably-sized problem/tiling sizes
 # and codegen options.
 
+import argparse
+import contextlib
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Tuple
+
 from ..core.experts import *
 from ..core.harness import *
 from ..core.transforms import *
@@ -25,6 +32,11 @@ all_names = [                    \
   "DoubleTile2DPadAndHoist",     \
 ]
 
+# Experts relying on padding. Unless experts are selected explicitly, fully
+# dynamic problems only run the peeling experts as peeling is the better
+# strategy when no size is known statically.
+pad_names = {"SingleTiling3DPad", "DoubleTile2DPadAndHoist"}
+
 
 def all_experts(fun_name):
   return [
@@ -91,6 +103,106 @@ def all_experts(fun_name):
 
 keys = ['m', 'n', 'k']
 
+_NO_COMMA = str.maketrans('', '', ',')
+
+
+def fun_name_with_spec(spec: str) -> str:
+  """Return the benchmarked function name for `spec`, e.g. `matmul_mkkn`."""
+  return f'{fun_name}_{spec}'.translate(_NO_COMMA)
+
+
+def _get_operand_selectors(
+    spec: str, transpose: Callable) -> Tuple[Callable, Callable]:
+  """Return the functions applied to A and B to match the transposes of `spec`.
+
+  The reference kernels are specialized on the spec once, outside of the timed
+  loop, rather than testing the spec on every iteration.
+  """
+  transpose_a = spec == 'km,kn'
+  transpose_b = spec == 'mk,nk'
+  identity = lambda x: x
+  return (transpose if transpose_a else identity,
+          transpose if transpose_b else identity)
+
+
+def make_numpy_kernel(spec: str) -> Callable:
+  """Return a NumPy matmul kernel with the operand transposes of `spec`."""
+  select_a, select_b = _get_operand_selectors(spec, lambda x: x.T)
+
+  def numpy_kernel(args, sizes, types):
+    A, B, C = args
+    C.fill(0.)
+    np.dot(select_a(A), select_b(B), out=C)
+
+  return numpy_kernel
+
+
+def make_pytorch_kernel(spec: str) -> Callable:
+  """Return a PyTorch matmul kernel with the operand transposes of `spec`."""
+  select_a, select_b = _get_operand_selectors(spec, lambda x: x.t())
+
+  def pytorch_kernel(args, sizes, types):
+    import torch
+    A, B, C = args
+    C.fill_(0.)
+    torch.mm(select_a(A), select_b(B), out=C)
+
+  return pytorch_kernel
+
+
+def run_problem(spec: str,
+                dynamic_at_compile_time: Sequence[str],
+                experts: Mapping[str, TransformationList],
+                args: argparse.Namespace,
+                dump_data_to_file: str = '',
+                dump_ir_to_file: str = '/tmp/abc.mlir',
+                dump_obj_to_file: str = '/tmp/abc.o') -> Measurements:
+  """Benchmark `experts` on the matmul with the given spec and dynamic dims."""
+  numpy_kernel = make_numpy_kernel(spec)
+  pytorch_kernel = make_pytorch_kernel(spec)
+
+  func_with_spec = fun_name_with_spec(spec)
+  # The problem definition does not depend on the sizes or types: build it once
+  # and share it across all problem sizes.
+  problem_definition = EinsumProblem(spec, 'mnk', 2)
+
+  return test_harness(lambda s, t: problem_definition,
+                      [[np.float32] * 3],
+                      test_sizes(keys, args.problem_sizes_list),
+                      experts,
+                      n_iters=args.n_iters,
+                      dynamic_at_compile_time_sizes=set(
+                          dynamic_at_compile_time).intersection(keys),
+                      function_name=func_with_spec,
+                      dump_ir_to_file=dump_ir_to_file,
+                      dump_obj_to_file=dump_obj_to_file,
+                      dump_data_to_file=dump_data_to_file,
+                      numpy_benchmark=numpy_kernel,
+                      pytorch_benchmark=pytorch_kernel)
+
+
+def run_problem_in_worker(
+    spec: str, dynamic_at_compile_time: Sequence[str],
+    experts: Mapping[str, TransformationList],
+    args: argparse.Namespace) -> Tuple[str, Measurements]:
+  """Run `run_problem` in a pool worker and return its output and results.
+
+  Each worker dumps to its own files and captures its Python-level output so
+  that concurrent problems do not clobber each other's dumps or interleave their
+  tables. Diagnostics printed by MLIR itself still go to the process stderr.
+  """
+  dims = ''.join(dynamic_at_compile_time) or 'static'
+  suffix = f'{fun_name_with_spec(spec)}_{dims}'
+  output = io.StringIO()
+  with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+    measurements = run_problem(spec,
+                               dynamic_at_compile_time,
+                               experts,
+                               args,
+                               dump_ir_to_file=f'/tmp/abc_{suffix}.mlir',
+                               dump_obj_to_file=f'/tmp/abc_{suffix}.o')
+  return output.getvalue(), measurements
+
 
 # CHECK-NOT: FAILURE
 def main():
@@ -122,45 +234,51 @@ def main():
           'mk,nk'  # C += A.B^T  slowest
       ])
 
+  # Experts only depend on the function name, which only depends on the spec:
+  # build them once per spec rather than once per (dynamic, spec) combination.
+  experts_per_spec = {}
+  for spec in args.spec_list:
+    experts_per_spec[spec] = test_experts(
+        all_experts(fun_name_with_spec(spec)), all_names, args.expert_list)
+
+  # Only prune the padding experts from the default expert list: an explicit
+  # `--expert_list` always runs the experts it names.
+  skip_pad_experts = args.expert_list is all_names
+  problems = []
   for dynamic_at_compile_time in args.dynamic_at_compile_time_list:
     for spec in args.spec_list:
+      experts = experts_per_spec[spec]
+      if skip_pad_experts and set(keys).issubset(dynamic_at_compile_time):
+        skipped = sorted(pad_names.intersection(experts))
+        log(f'Skipping {skipped} on {fun_name_with_spec(spec)} dynamic at '
+            f'compile time {dynamic_at_compile_time}')
+        experts = {k: v for k, v in experts.items() if k not in pad_names}
+      problems.append((spec, dynamic_at_compile_time, experts))
+
+  # Every problem compiles in its own MLIR context and can run in a separate
+  # process. Measurements taken concurrently compete for the machine: only
+  # set SANDBOX_NUM_PROCESSES for quick sweeps, not for reported numbers.
+  num_processes = int(os.environ.get('SANDBOX_NUM_PROCESSES', '1'))
+  if num_processes <= 1:
+    for problem in problems:
+      run_problem(*problem, args, dump_data_to_file=args.dump_data)
+    return
 
-      def numpy_kernel(args, sizes, types):
-        A, B, C = args
-        C.fill(0.)
-        if spec == 'km,kn':
-          A = np.transpose(A)
-        if spec == 'mk,nk':
-          B = np.transpose(B)
-        np.dot(A, B, out=C)
-
-      def pytorch_kernel(args, sizes, types):
-        import torch
-        A, B, C = args
-        C.fill_(0.)
-        if spec == 'km,kn':
-          A = np.transpose(A)
-        if spec == 'mk,nk':
-          B = np.transpose(B)
-        torch.mm(A, B, out=C)
-
-      func_with_spec = fun_name + '_' + spec
-      func_with_spec = func_with_spec.replace(',', '')
-
-      test_harness(lambda s, t: EinsumProblem(spec, 'mnk', 2),
-                   [[np.float32] * 3],
-                   test_sizes(keys, args.problem_sizes_list),
-                   test_experts(all_experts(func_with_spec), all_names,
-                                args.expert_list),
-                   n_iters=args.n_iters,
-                   dynamic_at_compile_time_sizes=set(
-                       dynamic_at_compile_time).intersection(keys),
-                   function_name=func_with_spec,
-                   dump_ir_to_file='/tmp/abc.mlir',
-                   dump_obj_to_file='/tmp/abc.o',
-                   dump_data_to_file=args.dump_data,
-                   numpy_benchmark=numpy_kernel,
-                   pytorch_benchmark=pytorch_kernel)
+  # Workers return their output and measurements. The parent prints and dumps
+  # them one problem at a time so that concurrent workers never race on stdout
+  # or on the data file.
+  with ProcessPoolExecutor(max_workers=num_processes) as executor:
+    futures = [
+        executor.submit(run_problem_in_worker, *problem, args)
+        for problem in problems
+    ]
+    for (spec, dynamic_at_compile_time, _), future in zip(problems, futures):
+      output, measurements = future.result()
+      print(f'\n[[[ Problem {fun_name_with_spec(spec)}, dynamic at compile '
+            f'time {dynamic_at_compile_time} ]]]')
+      print(output, end='')
+      if args.dump_data:
+        measurements.dump_raw_to_file(args.dump_data)
 
 
 if __name__ == '__main__':
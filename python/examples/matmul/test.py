@@ -162,6 +162,13 @@ expert_fuse_and_pad = TestExpert([
     Vectorize('matmul', 'linalg.fill')
 ])
 
+# Print the pipelines before running them. The trailing cleanup of Vectorize is
+# elided as Bufferize starts by canonicalizing the IR anyway.
+expert_print_pipeline = TestExpert([
+    Tile('matmul', 'linalg.generic', tile_sizes=[8, 8, 24]),
+    Vectorize('matmul', 'linalg.generic')
+]).print_pipeline(before_all=True)
+
 all_experts = [
     e.print_ir(after_all=True) for e in [
         expert_no_tiling, expert_tile_1, expert_tile_and_interchange_1,
@@ -190,6 +197,18 @@ def main():
                n_iters=n_iters,
                function_name='matmul')
 
+  # CHECK: [[[ Run pipeline:
+  # CHECK-NEXT: builtin.func(linalg-single-tiling-expert-driver{anchor-func=matmul anchor-op=linalg.generic tile-sizes=8,8,24 },canonicalize,cse)'
+  # CHECK: [[[ Run pipeline:
+  # CHECK-NEXT: builtin.func(linalg-single-tiling-expert-driver{ anchor-func=matmul anchor-op=linalg.generic vectorize vectorize-padding})'
+  # CHECK: [[[ Run pipeline:
+  # CHECK-NEXT: -pass-pipeline='linalg-bufferization-driver
+  # CHECK-NOT: FAILURE
+  test_harness(lambda s, t: EinsumProblem('mk,kn', 'mnk', 2), [[np.float32] * 3],
+               test_sizes(keys, problem_size_list[:1]), [expert_print_pipeline],
+               n_iters=n_iters,
+               function_name='matmul')
+
 
 if __name__ == '__main__':
   main()